@@ -3,6 +3,8 @@ import os
 import random
 from collections import OrderedDict
 from collections import defaultdict
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 import bpy
 
@@ -11,11 +13,6 @@ try:
 except ImportError:
     Image = None
 
-try:
-    from PIL import ImageChops
-except ImportError:
-    ImageChops = None
-
 try:
     from PIL import ImageFile
 except ImportError:
@@ -26,11 +23,9 @@ from ...utils.objects import get_obs
 from ...utils.objects import get_polys
 from ...utils.objects import get_uv
 from ...utils.objects import align_uv
-from ...utils.materials import shader_type
 from ...utils.materials import get_diffuse
+from ...utils.materials import get_image_from_material
 from ...utils.materials import sort_materials
-from ...utils.textures import get_texture
-from ...utils.images import get_image
 from ...utils.images import get_image_path
 
 if Image:
@@ -104,9 +99,9 @@ def get_structure(scn, data, mats_uv):
                         'ob': [],
                         'uv': []
                     }
-                if mat.root_mat and mat not in structure[root_mat]['dup']:
+                if mat.root_mat and mat.name not in structure[root_mat]['dup']:
                     structure[root_mat]['dup'].append(mat.name)
-                if ob not in structure[root_mat]['ob']:
+                if ob.name not in structure[root_mat]['ob']:
                     structure[root_mat]['ob'].append(ob.name)
                 structure[root_mat]['uv'].extend(mats_uv[ob_n][mat])
     return structure
@@ -137,18 +132,16 @@ def get_material_index(mesh, mat_name):
 
 def get_size(scn, data):
     for mat, i in data.items():
-        if globs.version > 0:
-            img = None
-            shader = shader_type(mat) if mat else None
-            if shader == 'mmd':
-                img = mat.node_tree.nodes['mmd_base_tex'].image
-            elif shader == 'vrm' or shader == 'xnalara' or shader == 'diffuse' or shader == 'emission':
-                img = mat.node_tree.nodes['Image Texture'].image
-        else:
-            img = get_image(get_texture(mat))
+        img = get_image_from_material(mat)
         path = get_image_path(img)
-        max_x = max(max([uv.x for uv in i['uv'] if not math.isnan(uv.x)], default=1), 1)
-        max_y = max(max([uv.y for uv in i['uv'] if not math.isnan(uv.y)], default=1), 1)
+        i['gfx']['img'] = path
+        max_x = max_y = 1
+        for uv in i['uv']:
+            x, y = uv.x, uv.y
+            if x > max_x:
+                max_x = x
+            if y > max_y:
+                max_y = y
         i['gfx']['uv_size'] = (max_x if max_x < 25 else 1, max_y if max_y < 25 else 1)
         if not scn.smc_crop:
             i['gfx']['uv_size'] = tuple(map(math.ceil, i['gfx']['uv_size']))
@@ -165,81 +158,98 @@ def get_size(scn, data):
     return OrderedDict(sorted(data.items(), key=lambda x: min(x[1]['gfx']['size']), reverse=True))
 
 
-def get_uv_image(item, img, size):
-    uv_img = Image.new('RGBA', size)
+def paste_uv_image(atlas, item, img, pos, size):
+    img_w, img_h = img.size
     for w in range(math.ceil(item['gfx']['uv_size'][0])):
+        left = w * img_w
+        if left >= size[0]:
+            break
+        right = min(img_w, size[0] - left)
         for h in range(math.ceil(item['gfx']['uv_size'][1])):
-            uv_img.paste(img, (
-                w * img.size[0],
-                uv_img.size[1] - img.size[1] - h * img.size[1],
-                w * img.size[0] + img.size[0],
-                uv_img.size[1] - img.size[1] - h * img.size[1] + img.size[1]
-            ))
-    return uv_img
-
-
-def get_gfx(scn, mat, item, src):
-    size = tuple(size - int(scn.smc_gaps) for size in item['gfx']['size'])
-    if isinstance(src, str):
-        if src:
-            img = Image.open(src).convert('RGBA')
-            if img.size != size:
-                img.resize(size, Image.ANTIALIAS)
-            if mat.smc_size:
-                img.thumbnail((mat.smc_size_width, mat.smc_size_height), Image.ANTIALIAS)
-            if any(item['gfx']['uv_size']) > 0.999:
-                img = get_uv_image(item, img, size)
-            if mat.smc_diffuse:
-                diffuse_img = Image.new('RGBA', size, get_diffuse(mat))
-                img = ImageChops.multiply(img, diffuse_img)
-        else:
-            img = Image.new('RGBA', size, get_diffuse(mat))
+            upper = size[1] - img_h - h * img_h
+            if upper + img_h <= 0:
+                break
+            tile = img if right == img_w and upper >= 0 else img.crop((0, max(-upper, 0), right, img_h))
+            atlas.paste(tile, (pos[0] + left, pos[1] + max(upper, 0)))
+
+
+def get_gfx_args(mat, src):
+    max_size = (mat.smc_size_width, mat.smc_size_height) if mat.smc_size else None
+    diffuse = get_diffuse(mat) if mat.smc_diffuse else None
+    return src, max_size, diffuse
+
+
+def get_gfx(src, max_size, diffuse):
+    img = Image.open(src)
+    if max_size:
+        img.draft(None, (max_size[0] * 2, max_size[1] * 2))
+    if img.mode == 'RGBA':
+        img.load()
     else:
-        img = Image.new('RGBA', size, src)
+        img = img.convert('RGBA')
+    if max_size:
+        img.thumbnail(max_size, Image.ANTIALIAS)
+    if diffuse and any(c != 255 for c in diffuse):
+        img = img.point([i * c // 255 for c in (diffuse + (255,))[:4] for i in range(256)])
     return img
 
 
+def paste_gfx(atlas, item, pos, size, future):
+    gfx_img = future.result()
+    if gfx_img.size != size:
+        paste_uv_image(atlas, item, gfx_img, pos, size)
+    else:
+        atlas.paste(gfx_img, pos)
+
+
 def get_atlas(scn, data, size):
     if scn.smc_size == 'PO2':
         size = tuple(1 << (x - 1).bit_length() for x in size)
     elif scn.smc_size == 'QUAD':
         size = (max(size),) * 2
-    for mat, item in data.items():
-        if globs.version > 0:
-            item['gfx']['img'] = ''
-            shader = shader_type(mat) if mat else None
-            if shader == 'mmd':
-                item['gfx']['img'] = get_image_path(mat.node_tree.nodes['mmd_base_tex'].image)
-            elif shader == 'vrm' or shader == 'xnalara' or shader == 'diffuse' or shader == 'emission':
-                item['gfx']['img'] = get_image_path(mat.node_tree.nodes['Image Texture'].image)
-        else:
-            item['gfx']['img'] = get_image_path(get_image(get_texture(mat)))
+    gaps = int(scn.smc_gaps)
+    half_gaps = int(scn.smc_gaps / 2)
     img = Image.new('RGBA', size)
-    for mat, i in data.items():
-        if i['gfx']['fit']:
-            if i['gfx']['img'] is not None:
-                img.paste(get_gfx(scn, mat, i, i['gfx']['img']), (i['gfx']['fit']['x'] + int(scn.smc_gaps / 2),
-                                                                  i['gfx']['fit']['y'] + int(scn.smc_gaps / 2)))
+    max_workers = os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        gfx = deque()
+        for mat, i in data.items():
+            if not i['gfx']['fit'] or i['gfx']['img'] is None:
+                continue
+            pos = (i['gfx']['fit']['x'] + half_gaps, i['gfx']['fit']['y'] + half_gaps)
+            gfx_size = (i['gfx']['size'][0] - gaps, i['gfx']['size'][1] - gaps)
+            if i['gfx']['img']:
+                if len(gfx) >= max_workers:
+                    paste_gfx(img, *gfx.popleft())
+                gfx.append((i, pos, gfx_size, executor.submit(get_gfx, *get_gfx_args(mat, i['gfx']['img']))))
+            else:
+                img.paste(get_diffuse(mat), pos + (pos[0] + gfx_size[0], pos[1] + gfx_size[1]))
+        while gfx:
+            paste_gfx(img, *gfx.popleft())
     if scn.smc_size == 'CUST':
         img.thumbnail((scn.smc_size_width, scn.smc_size_height), Image.ANTIALIAS)
     return img
 
 
 def get_aligned_uv(scn, data, size):
+    gaps = int(scn.smc_gaps)
+    half_gaps = int(scn.smc_gaps / 2)
     for mat, i in data.items():
         w, h = i['gfx']['size']
         uv_w, uv_h = i['gfx']['uv_size']
+        scale_x = (w - 2 - gaps) / uv_w / size[0]
+        scale_y = (h - 2 - gaps) / uv_h / size[1]
+        offset_x = (i['gfx']['fit']['x'] + 1 + half_gaps) / size[0]
+        offset_y = 1 - h / size[1] - (i['gfx']['fit']['y'] - 1 - half_gaps) / size[1]
         for uv in i['uv']:
-            reset_x = uv.x / uv_w * (w - 2 - int(scn.smc_gaps)) / size[0]
-            reset_y = 1 + uv.y / uv_h * (h - 2 - int(scn.smc_gaps)) / size[1] - h / size[1]
-            uv.x = reset_x + (i['gfx']['fit']['x'] + 1 + int(scn.smc_gaps / 2)) / size[0]
-            uv.y = reset_y - (i['gfx']['fit']['y'] - 1 - int(scn.smc_gaps / 2)) / size[1]
+            uv.x = uv.x * scale_x + offset_x
+            uv.y = uv.y * scale_y + offset_y
 
 
 def get_comb_mats(scn, atlas, mats_uv):
     layers = set(i.layer for i in scn.smc_ob_data if (i.type == 1) and i.used and (i.mat in mats_uv[i.ob.name].keys()))
-    existed_ids = [int(i.mat.name.split('_')[-2]) for i in scn.smc_ob_data if (i.type == 1) and
-                   i.mat.name.startswith('material_atlas_')]
+    existed_ids = {int(i.mat.name.split('_')[-2]) for i in scn.smc_ob_data if (i.type == 1) and
+                   i.mat.name.startswith('material_atlas_')}
     unique_id = random.choice([i for i in range(10000, 99999) if i not in existed_ids])
     path = os.path.join(scn.smc_save_path, 'Atlas_{0}.png'.format(unique_id))
     atlas.save(path)
@@ -34,8 +34,8 @@ class BinPacker(object):
         self.root = {'x': 0, 'y': 0, 'w': w, 'h': h}
         for img in images.values():
             w, h = img['gfx']['size']
-            if self.find_node(self.root, w, h):
-                node = self.find_node(self.root, w, h)
+            node = self.find_node(self.root, w, h)
+            if node:
                 img['gfx']['fit'] = self.split_node(node, w, h)
             else:
                 img['gfx']['fit'] = self.grow_node(w, h)
@@ -80,8 +80,8 @@ class BinPacker(object):
             'h': self.root['h'],
             'down': self.root,
             'right': {'x': self.root['w'], 'y': 0, 'w': w, 'h': self.root['h']}}
-        if self.find_node(self.root, w, h):
-            node = self.find_node(self.root, w, h)
+        node = self.find_node(self.root, w, h)
+        if node:
             return self.split_node(node, w, h)
         return None
 
@@ -95,7 +95,7 @@ class BinPacker(object):
             'down': {'x': 0, 'y': self.root['h'], 'w': self.root['w'], 'h': h},
             'right': self.root
         }
-        if self.find_node(self.root, w, h):
-            node = self.find_node(self.root, w, h)
+        node = self.find_node(self.root, w, h)
+        if node:
             return self.split_node(node, w, h)
         return None
@@ -1,9 +1,8 @@
 import bpy
 from bpy.props import *
 from .. import globs
-from ..utils.images import get_image
+from ..utils.materials import get_image_from_material
 from ..utils.materials import shader_type
-from ..utils.textures import get_texture
 
 
 class PropertiesMenu(bpy.types.Operator):
@@ -30,15 +29,7 @@ class PropertiesMenu(bpy.types.Operator):
     def draw(self, context):
         scn = context.scene
         item = scn.smc_ob_data[scn.smc_list_id]
-        if globs.version > 0:
-            img = None
-            shader = shader_type(item.mat) if item.mat else None
-            if shader == 'mmd':
-                img = item.mat.node_tree.nodes['mmd_base_tex'].image
-            elif shader == 'vrm' or shader == 'xnalara' or shader == 'diffuse' or shader == 'emission':
-                img = item.mat.node_tree.nodes['Image Texture'].image
-        else:
-            img = get_image(get_texture(item.mat))
+        img = get_image_from_material(item.mat)
         layout = self.layout
         col = layout.column()
         col.scale_y = 1.2
@@ -2,11 +2,18 @@ import os
 
 import bpy
 
+excluded_extensions = frozenset(('.spa', '.sph'))
+
 
 def get_image(tex):
     return tex.image if tex and hasattr(tex, 'image') and tex.image else None
 
 
 def get_image_path(img):
-    path = bpy.path.abspath(img.filepath) if img else ''
-    return path if os.path.isfile(path) and not path.lower().endswith(('.spa', '.sph')) else ''
+    if not img:
+        return ''
+    filepath = img.filepath
+    if os.path.splitext(filepath)[1].lower() in excluded_extensions:
+        return ''
+    path = bpy.path.abspath(filepath)
+    return path if os.path.isfile(path) else ''
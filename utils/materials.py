@@ -1,99 +1,100 @@
 import math
 from collections import defaultdict
 
-import bpy
 from .images import get_image
 from .images import get_image_path
 from .textures import get_texture
 from .. import globs
 
+shader_image_nodes = {
+    'mmd': 'mmd_base_tex',
+    'vrm': 'Image Texture',
+    'xnalara': 'Image Texture',
+    'diffuse': 'Image Texture',
+    'emission': 'Image Texture',
+}
+
+shader_diffuse_sockets = {
+    'mmdCol': ('mmd_shader', 'inputs', 'Diffuse Color'),
+    'vrm': ('RGB', 'outputs', 0),
+    'vrmCol': ('Group', 'inputs', 10),
+    'diffuseCol': ('Diffuse BSDF', 'inputs', 'Color'),
+    'xnalaraNewCol': ('Group', 'inputs', 'Diffuse'),
+    'xnalaraCol': ('Principled BSDF', 'inputs', 'Base Color'),
+}
+
 
 def get_materials(ob):
     return [mat_slot.material for mat_slot in ob.material_slots]
 
 
 def shader_type(mat):
-    if (mat.node_tree and mat.node_tree.nodes and 'mmd_shader' in mat.node_tree.nodes and
-            'mmd_base_tex' in mat.node_tree.nodes):
-        return 'mmd'
-    elif mat.node_tree and mat.node_tree.nodes and 'mmd_shader' in mat.node_tree.nodes:
-        return 'mmdCol'
-    elif (mat.node_tree and mat.node_tree.nodes and 'Group' in mat.node_tree.nodes and 'Image Texture' in
-          mat.node_tree.nodes and mat.node_tree.nodes['Group'].node_tree.name == 'MToon_unversioned'):
-        return 'vrm'
-    elif (mat.node_tree and mat.node_tree.nodes and 'Group' in mat.node_tree.nodes and
-          mat.node_tree.nodes['Group'].node_tree.name == 'MToon_unversioned'):
-        return 'vrmCol'
-    elif (mat.node_tree and mat.node_tree.nodes and 'Group' in mat.node_tree.nodes and
-          mat.node_tree.nodes['Group'].node_tree.name == 'XPS Shader' and 'Image Texture' in mat.node_tree.nodes):
-        return 'xnalara'
-    elif (mat.node_tree and mat.node_tree.nodes and 'Group' in mat.node_tree.nodes and
-          mat.node_tree.nodes['Group'].node_tree.name == 'Group'):
-        return 'xnalaraNewCol'
-    elif (mat.node_tree and mat.node_tree.nodes and 'Principled BSDF' in mat.node_tree.nodes and
-          'Image Texture' in mat.node_tree.nodes):
-        return 'xnalara'
-    elif mat.node_tree and mat.node_tree.nodes and 'Principled BSDF' in mat.node_tree.nodes:
-        return 'xnalaraCol'
-    elif (mat.node_tree and mat.node_tree.nodes and 'Diffuse BSDF' in mat.node_tree.nodes and
-          'Image Texture' in mat.node_tree.nodes):
-        return 'diffuse'
-    elif mat.node_tree and mat.node_tree.nodes and 'Diffuse BSDF' in mat.node_tree.nodes:
-        return 'diffuseCol'
-    elif (mat.node_tree and mat.node_tree.nodes and 'Emission' in mat.node_tree.nodes and
-          'Image Texture' in mat.node_tree.nodes):
-        return 'emission'
-    elif mat.node_tree and mat.node_tree.nodes and 'Emission' in mat.node_tree.nodes:
-        return 'emissionCol'
+    nodes = mat.node_tree.nodes if mat.node_tree else None
+    if not nodes:
+        return None
+    has_image = 'Image Texture' in nodes
+    if 'mmd_shader' in nodes:
+        return 'mmd' if 'mmd_base_tex' in nodes else 'mmdCol'
+    if 'Group' in nodes:
+        group_name = nodes['Group'].node_tree.name
+        if group_name == 'MToon_unversioned':
+            return 'vrm' if has_image else 'vrmCol'
+        elif group_name == 'XPS Shader' and has_image:
+            return 'xnalara'
+        elif group_name == 'Group':
+            return 'xnalaraNewCol'
+    if 'Principled BSDF' in nodes:
+        return 'xnalara' if has_image else 'xnalaraCol'
+    elif 'Diffuse BSDF' in nodes:
+        return 'diffuse' if has_image else 'diffuseCol'
+    elif 'Emission' in nodes:
+        return 'emission' if has_image else 'emissionCol'
 
 
 def sort_materials(mat_list):
-    for mat in bpy.data.materials:
-        mat.root_mat = None
+    for mat in mat_list:
+        if mat:
+            mat.root_mat = None
     mat_dict = defaultdict(list)
+    sort_keys = {}
     for mat in mat_list:
-        if globs.version > 0:
-            path = None
-            shader = shader_type(mat) if mat else False
-            if shader == 'mmd':
-                path = get_image_path(mat.node_tree.nodes['mmd_base_tex'].image)
-            elif shader == 'vrm' or shader == 'xnalara' or shader == 'diffuse' or shader == 'emission':
-                path = get_image_path(mat.node_tree.nodes['Image Texture'].image)
-        else:
-            path = get_image_path(get_image(get_texture(mat)))
-        if path:
-            mat_dict[(path, get_diffuse(mat) if mat.smc_diffuse else None)].append(mat)
-        else:
-            mat_dict[get_diffuse(mat)].append(mat)
+        if mat not in sort_keys:
+            sort_keys[mat] = get_sort_key(mat)
+        mat_dict[sort_keys[mat]].append(mat)
     return mat_dict
 
 
+def get_sort_key(mat):
+    path = get_image_path(get_image_from_material(mat))
+    if path:
+        return path, get_diffuse(mat) if mat.smc_diffuse else None
+    return get_diffuse(mat)
+
+
+def get_image_from_material(mat):
+    if globs.version > 0:
+        node_name = shader_image_nodes.get(shader_type(mat)) if mat else None
+        return mat.node_tree.nodes[node_name].image if node_name else None
+    return get_image(get_texture(mat))
+
+
 def rgb_to_255_scale(diffuse):
     rgb = []
     for c in diffuse:
         if c < 0.0031308:
             srgb = 0.0 if c < 0.0 else c * 12.92
         else:
-            srgb = 1.055 * math.pow(c, 1.0 / 2.4) - 0.055
-        rgb.append(max(min(int(srgb * 255 + 0.5), 255), 0))
+            srgb = min(1.055 * math.pow(c, 1.0 / 2.4) - 0.055, 1.0)
+        rgb.append(int(srgb * 255 + 0.5))
     return tuple(rgb)
 
 
 def get_diffuse(mat):
     if globs.version:
-        shader = shader_type(mat) if mat else False
-        if shader == 'mmdCol':
-            return rgb_to_255_scale(mat.node_tree.nodes['mmd_shader'].inputs['Diffuse Color'].default_value[:])
-        elif shader == 'vrm':
-            return rgb_to_255_scale(mat.node_tree.nodes['RGB'].outputs[0].default_value[:])
-        elif shader == 'vrmCol':
-            return rgb_to_255_scale(mat.node_tree.nodes['Group'].inputs[10].default_value[:])
-        elif shader == 'diffuseCol':
-            return rgb_to_255_scale(mat.node_tree.nodes['Diffuse BSDF'].inputs['Color'].default_value[:])
-        elif shader == 'xnalaraNewCol':
-            return rgb_to_255_scale(mat.node_tree.nodes['Group'].inputs['Diffuse'].default_value[:])
-        elif shader == 'xnalaraCol':
-            return rgb_to_255_scale(mat.node_tree.nodes['Principled BSDF'].inputs['Base Color'].default_value[:])
+        socket = shader_diffuse_sockets.get(shader_type(mat)) if mat else None
+        if socket:
+            node_name, direction, key = socket
+            return rgb_to_255_scale(getattr(mat.node_tree.nodes[node_name], direction)[key].default_value[:])
         return tuple((255, 255, 255))
     else:
         return rgb_to_255_scale(mat.diffuse_color)
@@ -17,13 +17,22 @@ def get_polys(ob):
 
 
 def get_uv(ob, poly):
-    return [ob.data.uv_layers.active.data[loop_idx].uv for loop_idx in poly.loop_indices if poly.loop_indices]
+    uv_data = ob.data.uv_layers.active.data
+    return [uv_data[loop_idx].uv for loop_idx in poly.loop_indices]
 
 
 def align_uv(face_uv):
-    min_x = min([math.floor(uv.x) if uv.x != 0.999 else 1 for uv in face_uv if not math.isnan(uv.x)], default=0)
-    min_y = min([math.floor(uv.y) if uv.y != 0.999 else 1 for uv in face_uv if not math.isnan(uv.y)], default=0)
+    min_x = min_y = math.inf
     for uv in face_uv:
-        uv.x -= min_x
-        uv.y -= min_y
+        x, y = uv.x, uv.y
+        if not math.isnan(x):
+            min_x = min(min_x, math.floor(x) if x != 0.999 else 1)
+        if not math.isnan(y):
+            min_y = min(min_y, math.floor(y) if y != 0.999 else 1)
+    min_x = 0 if min_x == math.inf else min_x
+    min_y = 0 if min_y == math.inf else min_y
+    if min_x or min_y:
+        for uv in face_uv:
+            uv.x -= min_x
+            uv.y -= min_y
     return face_uv